@@ -1,11 +1,16 @@
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Frames are rendered off-screen, possibly in worker processes
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, FFMpegWriter
 from vtk.util import numpy_support
 import vtk
 from pathlib import Path
 import logging
-from typing import Dict, Any, Optional
+import os
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 import time
 from datetime import datetime
 
@@ -13,6 +18,63 @@ from datetime import datetime
 logger = logging.getLogger('clover_vis')
 logger.setLevel(logging.WARNING)  # Change to ERROR if you want to suppress even more
 
+# Animation frame geometry (inches, dpi) and frames rendered per worker task
+FRAME_SIZE = (10, 10)
+FRAME_DPI = 100
+FRAMES_PER_TASK = 16
+
+# Rendered frames (4 MB of RGBA each) allowed in flight before ffmpeg takes them
+MAX_FRAMES_IN_FLIGHT = 64
+
+# Point-data arrays written to the timestep NPY (the magnitude is derived from the components)
+SAVED_ARRAYS = ('x_vel', 'y_vel')
+
+# This process's mapping of timesteps.npy, opened once and reused for every timestep
+_timesteps_map: Optional[np.memmap] = None
+
+def _timesteps_memmap(path: Path) -> np.memmap:
+    """Return this process's read-write mapping of the timestep file, opening it on first use"""
+    global _timesteps_map
+    if _timesteps_map is None or _timesteps_map.filename != os.path.abspath(path):
+        _timesteps_map = np.load(path, mmap_mode='r+')
+    return _timesteps_map
+
+def _release_timesteps_memmap() -> None:
+    """Flush and drop this process's timestep mapping (before the file is recreated or read)"""
+    global _timesteps_map
+    if _timesteps_map is not None:
+        _timesteps_map.flush()
+        _timesteps_map = None
+
+def _convert_one(args: Tuple['CloverVisualizer', int, Path]) -> None:
+    """Worker: convert one VTK file into its timestep slot (VTK objects are built in-process)"""
+    visualizer, timestep, vtk_file = args
+    logger.debug(f"Processing timestep {timestep} from {vtk_file.name}")
+    data = visualizer.read_vtk_file(vtk_file, arrays=SAVED_ARRAYS)
+    visualizer.save_timestep_data(data, timestep)
+
+def _render_frames(args: Tuple[List[int], List[np.ndarray], np.ndarray, np.ndarray, str]) -> List[bytes]:
+    """Worker: render a contiguous run of animation frames to raw RGBA buffers"""
+    frame_ids, frames, x, y, variable = args
+    fig = plt.figure(figsize=FRAME_SIZE, dpi=FRAME_DPI)
+    ax = plt.Axes(fig, [0.1, 0.1, 0.8, 0.8])
+    fig.add_axes(ax)
+    
+    # Build the artists once and only swap the data for each frame
+    mesh = ax.pcolormesh(x, y, frames[0], shading='auto', cmap='viridis')
+    title = ax.set_title('')
+    ax.set_aspect('equal')
+    
+    rendered = []
+    for frame, values in zip(frame_ids, frames):
+        mesh.set_array(values.ravel())
+        mesh.set_clim(values.min(), values.max())
+        title.set_text(f'{variable.title()} - Frame {frame}')
+        fig.canvas.draw()
+        rendered.append(bytes(fig.canvas.buffer_rgba()))
+    plt.close(fig)
+    return rendered
+
 class CloverVisualizer:
     def __init__(self, input_dir: str, output_dir: str, npy_dir: Optional[str] = None):
         self.input_dir = Path(input_dir)
@@ -21,11 +83,23 @@ class CloverVisualizer:
         
         self.npy_dir = Path(npy_dir) if npy_dir else self.output_dir / "npy_files"
         self.npy_dir.mkdir(parents=True, exist_ok=True)
+        self.timesteps_file = self.npy_dir / "timesteps.npy"
+        
+        # CloverLeaf's rectilinear grid is static, so coordinates are decoded once
+        self._coords = None
+        
+        # Sorted VTK inputs, scanned once and shared by conversion and animation
+        self._vtk_files = sorted(self.input_dir.glob("*.vtk"))
         
         self.timing_data = {'data_processing': 0, 'visualization': 0}
     
-    def read_vtk_file(self, filename: str) -> Dict[str, Any]:
-        """Read all data from VTK file"""
+    def invalidate(self) -> None:
+        """Rescan the input directory (e.g. after a new run has written VTK files)"""
+        self._vtk_files = sorted(self.input_dir.glob("*.vtk"))
+        self._coords = None
+    
+    def read_vtk_file(self, filename: str, arrays: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Read data from VTK file (all arrays, or only those named in `arrays`)"""
         try:
             logger.info(f"Reading file: {filename}")
             
@@ -38,9 +112,13 @@ class CloverVisualizer:
             cell_data = data.GetCellData()
             point_data = data.GetPointData()
             
-            # Get dimensions and coordinates
-            x_coords = numpy_support.vtk_to_numpy(data.GetXCoordinates())
-            y_coords = numpy_support.vtk_to_numpy(data.GetYCoordinates())
+            # Get dimensions and coordinates (copied out of VTK once, then reused)
+            if self._coords is None:
+                self._coords = (numpy_support.vtk_to_numpy(data.GetXCoordinates()).copy(),
+                                numpy_support.vtk_to_numpy(data.GetYCoordinates()).copy())
+            x_coords, y_coords = self._coords
+            cell_shape = (len(y_coords) - 1, len(x_coords) - 1)
+            point_shape = (len(y_coords), len(x_coords))
             
             result = {
                 'x_coords': x_coords,
@@ -49,25 +127,36 @@ class CloverVisualizer:
                 'point_data': {}
             }
             
-            # Extract cell-centered data
-            for i in range(cell_data.GetNumberOfArrays()):
-                name = cell_data.GetArrayName(i)
-                array = numpy_support.vtk_to_numpy(cell_data.GetArray(i))
-                array = array.reshape((len(y_coords) - 1, len(x_coords) - 1))
-                result['cell_data'][name] = array
-            
-            # Extract point-centered data
-            for i in range(point_data.GetNumberOfArrays()):
-                name = point_data.GetArrayName(i)
-                array = numpy_support.vtk_to_numpy(point_data.GetArray(i))
-                array = array.reshape((len(y_coords), len(x_coords)))
-                result['point_data'][name] = array
+            if arrays is None:
+                # Extract cell-centered data
+                for i in range(cell_data.GetNumberOfArrays()):
+                    name = cell_data.GetArrayName(i)
+                    array = numpy_support.vtk_to_numpy(cell_data.GetArray(i))
+                    result['cell_data'][name] = array.reshape(cell_shape)
+                
+                # Extract point-centered data
+                for i in range(point_data.GetNumberOfArrays()):
+                    name = point_data.GetArrayName(i)
+                    array = numpy_support.vtk_to_numpy(point_data.GetArray(i))
+                    result['point_data'][name] = array.reshape(point_shape)
+            else:
+                # Only convert the requested arrays; the magnitude needs both components
+                names = set(arrays)
+                if 'velocity_magnitude' in names:
+                    names.update(('x_vel', 'y_vel'))
+                for name in names:
+                    if point_data.HasArray(name):
+                        array = numpy_support.vtk_to_numpy(point_data.GetArray(name))
+                        result['point_data'][name] = array.reshape(point_shape)
+                    elif cell_data.HasArray(name):
+                        array = numpy_support.vtk_to_numpy(cell_data.GetArray(name))
+                        result['cell_data'][name] = array.reshape(cell_shape)
             
             # Compute velocity magnitude if components exist
             if 'x_vel' in result['point_data'] and 'y_vel' in result['point_data']:
                 xvel = result['point_data']['x_vel']
                 yvel = result['point_data']['y_vel']
-                result['point_data']['velocity_magnitude'] = np.sqrt(xvel**2 + yvel**2)
+                result['point_data']['velocity_magnitude'] = np.hypot(xvel, yvel)
             
             return result
         except Exception as e:
@@ -75,81 +164,155 @@ class CloverVisualizer:
             raise
     
     def save_timestep_data(self, data: Dict[str, Any], timestep: int) -> None:
-        """Save all data from one timestep as a single NPY file"""
+        """Write one timestep into the shared memory-mapped timestep array"""
         try:
-            # Create 2D coordinate arrays
-            x_coords_2d = np.tile(data['x_coords'], (len(data['y_coords']), 1))
-            y_coords_2d = np.tile(data['y_coords'], (len(data['x_coords']), 1)).T
-            
             # Get velocity components and magnitude
             xvel = data['point_data']['x_vel']
             yvel = data['point_data']['y_vel']
             magnitude = data['point_data']['velocity_magnitude']
             
-            # Stack arrays for saving
-            data_array = np.stack([magnitude, xvel, yvel, x_coords_2d, y_coords_2d], axis=0)
-            
-            filename = self.npy_dir / f"timestep_{timestep:04d}.npy"
-            np.save(filename, data_array)
-            logger.info(f"Saved timestep {timestep} to {filename}")
+            # Cast each channel straight into this timestep's float32 slot; the
+            # shared mapping is written back by the kernel, so no per-timestep flush
+            timesteps = _timesteps_memmap(self.timesteps_file)
+            timesteps[timestep, 0] = magnitude
+            timesteps[timestep, 1] = xvel
+            timesteps[timestep, 2] = yvel
+            logger.info(f"Saved timestep {timestep} to {self.timesteps_file}")
         except Exception as e:
             logger.error(f"Error saving timestep {timestep}: {e}")
             raise
     
-    def process_all_files(self) -> None:
-        """Process all VTK files and save each timestep as a single NPY file."""
-        vtk_files = sorted(list(self.input_dir.glob("*.vtk")))
+    def process_all_files(self, jobs: Optional[int] = None) -> None:
+        """Process all VTK files into a single (T, 3, ny, nx) memory-mapped NPY file."""
+        vtk_files = self._vtk_files
         logger.info(f"Processing {len(vtk_files)} VTK files...")
         
-        for i, vtk_file in enumerate(vtk_files):
-            logger.debug(f"Processing timestep {i} from {vtk_file.name}")
-            data = self.read_vtk_file(vtk_file)
-            self.save_timestep_data(data, i)
+        if not vtk_files:
+            logger.error(f"No VTK files found in {self.input_dir}")
+            return
         
-        logger.info(f"Saved all timesteps to {self.npy_dir}")
-
+        # The first file fixes the grid shape; the grid is static, so the 1-D
+        # coordinates are stored once rather than with every timestep
+        first = self.read_vtk_file(vtk_files[0], arrays=SAVED_ARRAYS)
+        x_coords, y_coords = first['x_coords'], first['y_coords']
+        np.savez(self.npy_dir / "coords.npz", x=x_coords, y=y_coords)
+        
+        # Drop any mapping of a previous file before it is recreated
+        _release_timesteps_memmap()
+        timesteps = np.lib.format.open_memmap(
+            self.timesteps_file, mode='w+', dtype=np.float32,
+            shape=(len(vtk_files), 3, len(y_coords), len(x_coords)))
+        del timesteps
+        self.save_timestep_data(first, 0)
+        
+        # Timesteps are independent, so convert the rest across a process pool
+        tasks = [(self, i, vtk_file) for i, vtk_file in enumerate(vtk_files) if i > 0]
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            list(executor.map(_convert_one, tasks, chunksize=4))
+        
+        # One write-back of the whole file, once every worker is done
+        _release_timesteps_memmap()
+        logger.info(f"Saved all timesteps to {self.timesteps_file}")
 
-    def create_animation(self, variable: str = 'velocity_magnitude') -> float:
+    def create_animation(self, variable: str = 'velocity_magnitude',
+                         jobs: Optional[int] = None, stride: int = 1) -> float:
+        if stride < 1:
+            raise ValueError(f"stride must be a positive integer, got {stride}")
+        
         start_time = time.time()
-        vtk_files = sorted(list(self.input_dir.glob("*.vtk")))
+        vtk_files = self._vtk_files
         
         if not vtk_files:
             logger.error(f"No VTK files found in {self.input_dir}")
             return 0
         
-        fig = plt.figure(figsize=(10, 10))
-        ax = plt.Axes(fig, [0.1, 0.1, 0.8, 0.8])
-        fig.add_axes(ax)
+        # Only every `stride`-th timestep is read and rendered
+        frame_ids = list(range(0, len(vtk_files), stride))
         
-        data = self.read_vtk_file(vtk_files[0])
+        # Read each VTK file exactly once; the render workers only get arrays
+        frames = []
+        for vtk_file in vtk_files[::stride]:
+            data = self.read_vtk_file(vtk_file, arrays=(variable,))
+            frames.append(data['point_data'][variable].astype(np.float32))
         x, y = data['x_coords'], data['y_coords']
         
-        def update(frame):
-            ax.clear()
-            data = self.read_vtk_file(vtk_files[frame])
-            values = data['point_data'][variable]
-            
-            contour = ax.contourf(x, y, values, levels=20, cmap='viridis')
-            
-            ax.set_title(f'{variable.title()} - Frame {frame}')
-            ax.set_aspect('equal')
-            
-            # Remove the color bar by commenting out the following line:
-            # plt.colorbar(contour, ax=ax, label=variable)
-        
-        anim = FuncAnimation(fig, update, frames=len(vtk_files),
-                            interval=200, blit=False)
-        
         # Use the timestamp and iteration for consistent naming
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_file = self.output_dir / f"velocity_magnitude_evolution_{timestamp}.mp4"
-        writer = FFMpegWriter(fps=5, bitrate=2000)
-        anim.save(str(output_file), writer=writer)
-        plt.close(fig)
+        
+        # Workers render contiguous runs of frames to raw RGBA; the frames are piped
+        # in order into a single ffmpeg process, so nothing is PNG-encoded. The frame
+        # rate drops with the stride so the video keeps its real-time duration.
+        width, height = FRAME_SIZE[0] * FRAME_DPI, FRAME_SIZE[1] * FRAME_DPI
+        ffmpeg = subprocess.Popen(["ffmpeg", "-y", "-loglevel", "error",
+                                   "-f", "rawvideo", "-pix_fmt", "rgba",
+                                   "-s", f"{width}x{height}", "-framerate", f"5/{stride}", "-i", "-",
+                                   "-vcodec", "h264", "-pix_fmt", "yuv420p", "-b:v", "2000k",
+                                   str(output_file)],
+                                  stdin=subprocess.PIPE)
+        tasks = ((frame_ids[i:i + FRAMES_PER_TASK], frames[i:i + FRAMES_PER_TASK], x, y, variable)
+                 for i in range(0, len(frames), FRAMES_PER_TASK))
+        workers = jobs or os.cpu_count()
+        # ffmpeg is the bottleneck, so cap the tasks in flight by a fixed frame budget
+        # rather than by the worker count
+        max_pending = max(1, MAX_FRAMES_IN_FLIGHT // FRAMES_PER_TASK)
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, max_pending)) as executor:
+                pending = deque()
+                for task in tasks:
+                    pending.append(executor.submit(_render_frames, task))
+                    if len(pending) >= max_pending:
+                        for frame_bytes in pending.popleft().result():
+                            ffmpeg.stdin.write(frame_bytes)
+                while pending:
+                    for frame_bytes in pending.popleft().result():
+                        ffmpeg.stdin.write(frame_bytes)
+        except BaseException:
+            ffmpeg.kill()
+            raise
+        finally:
+            try:
+                ffmpeg.stdin.close()
+            except BrokenPipeError:
+                pass
+            ffmpeg.wait()
+            if ffmpeg.returncode != 0:
+                # Never leave a truncated video behind
+                output_file.unlink(missing_ok=True)
+        if ffmpeg.returncode != 0:
+            raise subprocess.CalledProcessError(ffmpeg.returncode, ffmpeg.args)
         
         elapsed_time = time.time() - start_time
         self.timing_data['visualization'] = elapsed_time
         return elapsed_time
 
     def get_timing_data(self) -> Dict[str, float]:
-        return self.timing_data
\ No newline at end of file
+        return self.timing_data
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='CloverLeaf data processing and visualization')
+    parser.add_argument('--input-dir', type=str, default='new_data',
+                      help='Directory containing VTK files')
+    parser.add_argument('--output-dir', type=str, default='visualizations',
+                      help='Directory to save visualizations')
+    parser.add_argument('--npy-dir', type=str, default=None,
+                      help='Directory to save NPY files (default: output_dir/npy_files)')
+    parser.add_argument('--jobs', type=int, default=None,
+                      help='Worker processes for NPY conversion and frame rendering (default: CPU count)')
+    parser.add_argument('--stride', type=int, default=1,
+                      help='Animate every Nth timestep (default: 1)')
+    parser.add_argument('--save-npy', action='store_true',
+                      help='Save data as NPY files')
+
+    args = parser.parse_args()
+    if args.stride < 1:
+        parser.error(f"--stride must be a positive integer, got {args.stride}")
+
+    visualizer = CloverVisualizer(args.input_dir, args.output_dir, args.npy_dir)
+
+    if args.save_npy:
+        visualizer.process_all_files(jobs=args.jobs)
+
+    visualizer.create_animation(jobs=args.jobs, stride=args.stride)
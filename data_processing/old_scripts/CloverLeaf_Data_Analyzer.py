@@ -2,14 +2,20 @@ import numpy as np
 import matplotlib.pyplot as plt
 from vtk import *
 import vtk.util.numpy_support as vtk_np
-import glob
 import os
 import logging
+import mmap
 import re
+from plot_utils import find_vtk_files
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Timestep summary block in clover.out, compiled once and matched on raw bytes
+TIMESTEP_PATTERN = re.compile(rb"Time\s+(\d+\.\d+)\s+Volume\s+Mass\s+Density\s+Pressure\s+Internal Energy\s+Kinetic Energy\s+Total Energy\s+step:\s+(\d+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)")
+TIMESTEP_FIELDS = ['time', 'step', 'volume', 'mass', 'density', 'pressure',
+                   'internal_energy', 'kinetic_energy', 'total_energy']
+
 class CloverLeafAnalyzer:
     def __init__(self, directory="."):
         self.directory = directory
@@ -19,44 +25,27 @@ class CloverLeafAnalyzer:
     # [UPDATED METHOD]
     def _find_vtk_files(self):
         """Find all VTK files and sort them by timestep"""
-        pattern = os.path.join(self.directory, "*.vtk")
-        files = glob.glob(pattern)
-        
-        def get_timestep(filename):
-            parts = filename.split('.')
-            if len(parts) >= 5:  # Ensure we have all parts
-                try:
-                    return int(parts[-2])  # Get the timestep number
-                except ValueError:
-                    return 0
-            return 0
-        
-        return sorted(files, key=get_timestep)
+        return find_vtk_files(self.directory)
     
     def _parse_output_file(self, filename="clover.out"):
         """Parse the clover.out file for timestep data"""
         timestep_data = {}
         try:
-            with open(filename, 'r') as f:
-                content = f.read()
-                
-            # Find all timestep data blocks
-            pattern = r"Time\s+(\d+\.\d+)\s+Volume\s+Mass\s+Density\s+Pressure\s+Internal Energy\s+Kinetic Energy\s+Total Energy\s+step:\s+(\d+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)"
-            matches = re.finditer(pattern, content)
+            with open(filename, 'rb') as f:
+                # An empty file (e.g. a run that has just started) can't be mapped
+                if os.fstat(f.fileno()).st_size == 0:
+                    logger.info("Parsed 0 timesteps from output file")
+                    return timestep_data
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    matches = TIMESTEP_PATTERN.findall(mm)
             
-            for match in matches:
-                time = float(match.group(1))
-                step = int(match.group(2))
-                timestep_data[step] = {
-                    'time': time,
-                    'volume': float(match.group(3)),
-                    'mass': float(match.group(4)),
-                    'density': float(match.group(5)),
-                    'pressure': float(match.group(6)),
-                    'internal_energy': float(match.group(7)),
-                    'kinetic_energy': float(match.group(8)),
-                    'total_energy': float(match.group(9))
-                }
+            # Convert every captured field in one batch instead of per-group float() calls
+            if matches:
+                values = np.array(matches).astype(np.float64)
+                for row in values:
+                    record = dict(zip(TIMESTEP_FIELDS, row.tolist()))
+                    step = int(record.pop('step'))
+                    timestep_data[step] = record
                 
             logger.info(f"Parsed {len(timestep_data)} timesteps from output file")
             return timestep_data
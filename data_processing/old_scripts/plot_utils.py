@@ -0,0 +1,27 @@
+import numpy as np
+import os
+import re
+
+# Trailing timestep number in VTK file names, e.g. clover.0001.00010.vtk
+VTK_TIMESTEP_PATTERN = re.compile(r"\.(\d+)\.vtk$")
+
+def find_vtk_files(directory):
+    """Find all VTK files in a directory and sort them by timestep (unnumbered names sort as 0)"""
+    files = [entry.path for entry in os.scandir(directory) if entry.name.endswith('.vtk')]
+    matches = (VTK_TIMESTEP_PATTERN.search(f) for f in files)
+    timesteps = np.fromiter((int(m.group(1)) if m else 0 for m in matches),
+                            dtype=np.int64, count=len(files))
+    order = np.argsort(timesteps, kind='stable')
+    return [files[i] for i in order]
+
+def plot_field(ax, x_coords, y_coords, values, cmap='viridis'):
+    """Draw a point-centred field, using imshow when the grid spacing is uniform"""
+    dx = x_coords[1] - x_coords[0]
+    dy = y_coords[1] - y_coords[0]
+    if np.allclose(np.diff(x_coords), dx) and np.allclose(np.diff(y_coords), dy):
+        # A single image artist; the extent puts pixel centres on the grid points
+        extent = [x_coords[0] - dx / 2, x_coords[-1] + dx / 2,
+                  y_coords[0] - dy / 2, y_coords[-1] + dy / 2]
+        return ax.imshow(values, origin='lower', extent=extent, interpolation='nearest',
+                         cmap=cmap, aspect='auto')
+    return ax.pcolormesh(x_coords, y_coords, values, shading='auto', cmap=cmap, rasterized=True)
@@ -1,16 +1,43 @@
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, FFMpegWriter
+from matplotlib.animation import FFMpegWriter
 from vtk.util import numpy_support
+from vtk.numpy_interface import dataset_adapter as dsa
 import vtk
 from pathlib import Path
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-process (3, ny, nx) float32 staging buffer reused by every save_timestep_data call
+_stack_buffer = None
+
+def _timestep_buffer(shape):
+    """Return this process's staging buffer, (re)allocating only when the grid shape changes"""
+    global _stack_buffer
+    if _stack_buffer is None or _stack_buffer.shape != shape:
+        _stack_buffer = np.empty(shape, dtype=np.float32)
+    return _stack_buffer
+
+def _process_one(args):
+    """Worker: convert one VTK file to its timestep NPY (VTK objects are built in-process)"""
+    visualizer, timestep, vtk_file = args
+    logger.info(f"Processing timestep {timestep} from {vtk_file.name}")
+    data = visualizer.read_vtk_file(vtk_file, variable=('x_vel', 'y_vel'), data_type='point_data')
+    visualizer.save_timestep_data(data, timestep)
+
+def _read_vtk_worker(args):
+    """Worker: read one VTK file and return the animated field with the grid coordinates"""
+    visualizer, vtk_file, variable, data_type = args
+    data = visualizer.read_vtk_file(vtk_file, variable=variable, data_type=data_type)
+    if variable not in data[data_type]:
+        raise ValueError(f"Variable '{variable}' not found in {data_type}")
+    return data[data_type][variable], data['x_coords'], data['y_coords']
+
 class CloverLeafVisualizer:
     def __init__(self, input_dir, output_dir, npy_dir=None):
         self.input_dir = Path(input_dir)
@@ -19,19 +46,32 @@ class CloverLeafVisualizer:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.npy_dir.mkdir(parents=True, exist_ok=True)
         
-    def read_vtk_file(self, filename):
-        """Read all data from VTK file"""
+    def read_vtk_file(self, filename, variable=None, data_type=None):
+        """Read data from VTK file (everything, or only the named `variable`(s) from `data_type`)"""
         try:
             logger.info(f"Reading file: {filename}")
             
+            # Arrays to convert; None means all of them. The magnitude is derived
+            # from the velocity components, so those are read in its place.
+            if variable is None:
+                names = None
+            else:
+                names = {variable} if isinstance(variable, str) else set(variable)
+            derive_magnitude = names is None or 'velocity_magnitude' in names
+            if names is not None and 'velocity_magnitude' in names:
+                names = (names - {'velocity_magnitude'}) | {'x_vel', 'y_vel'}
+            
+            # CloverLeaf writes its arrays as FIELD data, which the reader always
+            # parses in full; the selection below only skips converting them
             reader = vtk.vtkRectilinearGridReader()
             reader.SetFileName(str(filename))
             reader.ReadAllScalarsOn()
             reader.Update()
             
             data = reader.GetOutput()
-            cell_data = data.GetCellData()
-            point_data = data.GetPointData()
+            wrapped = dsa.WrapDataObject(data)
+            cell_data = wrapped.CellData
+            point_data = wrapped.PointData
             
             # Get dimensions and coordinates
             x_coords = numpy_support.vtk_to_numpy(data.GetXCoordinates())
@@ -44,31 +84,31 @@ class CloverLeafVisualizer:
                 'point_data': {}
             }
             
-            # Get cell-centered data
-            n_cell_arrays = cell_data.GetNumberOfArrays()
-            logger.info(f"Available cell-centered arrays:")
-            for i in range(n_cell_arrays):
-                name = cell_data.GetArrayName(i)
-                logger.info(f"  {name}")
-                array = numpy_support.vtk_to_numpy(cell_data.GetArray(i))
-                array = array.reshape((len(y_coords)-1, len(x_coords)-1))
+            # Get cell-centered data as float32
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Available cell-centered arrays: {', '.join(cell_data.keys())}")
+            for name in cell_data.keys():
+                if data_type == 'point_data' or (names is not None and name not in names):
+                    continue
+                array = np.asarray(cell_data[name], dtype=np.float32)
+                array = np.ascontiguousarray(array.reshape((len(y_coords)-1, len(x_coords)-1)))
                 result['cell_data'][name] = array
             
             # Get point-centered data
-            n_point_arrays = point_data.GetNumberOfArrays()
-            logger.info(f"Available point-centered arrays:")
-            for i in range(n_point_arrays):
-                name = point_data.GetArrayName(i)
-                logger.info(f"  {name}")
-                array = numpy_support.vtk_to_numpy(point_data.GetArray(i))
-                array = array.reshape((len(y_coords), len(x_coords)))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Available point-centered arrays: {', '.join(point_data.keys())}")
+            for name in point_data.keys():
+                if data_type == 'cell_data' or (names is not None and name not in names):
+                    continue
+                array = np.asarray(point_data[name], dtype=np.float32)
+                array = np.ascontiguousarray(array.reshape((len(y_coords), len(x_coords))))
                 result['point_data'][name] = array
                 
-            # Calculate velocity magnitude if velocity components exist
-            if 'x_vel' in result['point_data'] and 'y_vel' in result['point_data']:
+            # Calculate velocity magnitude if requested and the velocity components exist
+            if derive_magnitude and 'x_vel' in result['point_data'] and 'y_vel' in result['point_data']:
                 xvel = result['point_data']['x_vel']
                 yvel = result['point_data']['y_vel']
-                result['point_data']['velocity_magnitude'] = np.sqrt(xvel**2 + yvel**2)
+                result['point_data']['velocity_magnitude'] = np.hypot(xvel, yvel)
 
             return result
             
@@ -79,42 +119,43 @@ class CloverLeafVisualizer:
     def save_timestep_data(self, data, timestep):
         """Save all data from one timestep as a single NPY file"""
         try:
-            # Create 2D coordinate arrays
-            x_coords_2d = np.tile(data['x_coords'], (len(data['y_coords']), 1))
-            y_coords_2d = np.tile(data['y_coords'], (len(data['x_coords']), 1)).T
+            # The grid is static: store the 1-D coordinates once instead of tiling
+            # them into every timestep (consumers can broadcast them back)
+            if timestep == 0:
+                np.savez(self.npy_dir / 'coords.npz', x=data['x_coords'], y=data['y_coords'])
             
-            # Get velocity components and calculate magnitude
+            # Get velocity components
             xvel = data['point_data']['x_vel']
             yvel = data['point_data']['y_vel']
-            magnitude = data['point_data']['velocity_magnitude']
             
-            # Stack all arrays
-            data_array = np.stack([magnitude, xvel, yvel, x_coords_2d, y_coords_2d], axis=0)
+            # Stack the field arrays into the reused buffer, magnitude first
+            data_array = _timestep_buffer((3,) + xvel.shape)
+            np.hypot(xvel, yvel, out=data_array[0])
+            data_array[1] = xvel
+            data_array[2] = yvel
             
-            # Save to a single NPY file
+            # Save to a single NPY file (plain numeric data, so no pickle support)
             filename = self.npy_dir / f'timestep_{timestep:04d}.npy'
-            np.save(filename, data_array)
+            np.save(filename, data_array, allow_pickle=False)
             logger.info(f"Saved timestep {timestep} to {filename}")
             
         except Exception as e:
             logger.error(f"Error saving timestep {timestep}: {str(e)}")
             raise
 
-    def process_all_files(self):
+    def process_all_files(self, jobs=None):
         """Process all VTK files and save each timestep as a single NPY file"""
         vtk_files = sorted(list(self.input_dir.glob("*.vtk")))
         logger.info(f"Processing {len(vtk_files)} VTK files...")
         
-        for i, vtk_file in enumerate(vtk_files):
-            logger.info(f"Processing timestep {i} from {vtk_file.name}")
-            data = self.read_vtk_file(vtk_file)
-            self.save_timestep_data(data, i)
+        # Timesteps are independent, so convert them across a process pool
+        tasks = [(self, i, vtk_file) for i, vtk_file in enumerate(vtk_files)]
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            list(executor.map(_process_one, tasks))
         
         logger.info(f"Saved all timesteps to {self.npy_dir}")
-        
-        return metadata
 
-    def create_animation(self, variable='velocity_magnitude', data_type='point_data'):
+    def create_animation(self, variable='velocity_magnitude', data_type='point_data', jobs=None):
         """Create animation for specified variable"""
         # Original animation code remains the same
         vtk_files = sorted(list(self.input_dir.glob("*.vtk")))
@@ -132,42 +173,44 @@ class CloverLeafVisualizer:
         ax = plt.Axes(fig, [0.1, 0.1, 0.8, 0.8])
         fig.add_axes(ax)
         
-        # Read first frame
-        data = self.read_vtk_file(vtk_files[0])
-        if variable not in data[data_type]:
-            raise ValueError(f"Variable '{variable}' not found in {data_type}")
+        # Read every file exactly once up front, in parallel, keeping only the
+        # animated field; the frame loop below then only draws
+        tasks = [(self, vtk_file, variable, data_type) for vtk_file in vtk_files]
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            results = list(executor.map(_read_vtk_worker, tasks))
+        frames = [values for values, _, _ in results]
         
-        x = data['x_coords']
-        y = data['y_coords']
+        _, x, y = results[0]
         if data_type == 'cell_data':
             x = x[:-1]
             y = y[:-1]
         
-        def update(frame):
-            ax.clear()
-            data = self.read_vtk_file(vtk_files[frame])
-            values = data[data_type][variable]
-            
-            contour = ax.contourf(x, y, values, levels=20, cmap='viridis')
-            if frame == 0:
-                plt.colorbar(contour, ax=ax, label=variable)
-            
-            ax.set_title(f'{variable.replace("_", " ").title()} - Frame {frame}')
-            ax.set_xlabel('X')
-            ax.set_ylabel('Y')
-            ax.set_aspect('equal')
+        # One colour scale for the whole run, so the colorbar is stable and
+        # frames are directly comparable
+        vmin = min(values.min() for values in frames)
+        vmax = max(values.max() for values in frames)
         
-        logger.info(f"Creating animation for {variable}...")
-        anim = FuncAnimation(fig, update, frames=len(vtk_files),
-                           interval=200, blit=False)
+        # Create the mesh, colorbar and labels once; each frame only swaps values
+        mesh = ax.pcolormesh(x, y, frames[0], shading='auto', cmap='viridis', vmin=vmin, vmax=vmax)
+        plt.colorbar(mesh, ax=ax, label=variable)
+        title = ax.set_title('')
+        ax.set_xlabel('X')
+        ax.set_ylabel('Y')
+        ax.set_aspect('equal')
         
         output_file = self.output_dir / f'{variable}_evolution.mp4'
-        logger.info(f"Saving animation to {output_file}")
+        logger.info(f"Creating animation for {variable}, saving to {output_file}")
         
         writer = FFMpegWriter(fps=5, metadata=dict(artist='CloverLeaf Visualizer'),
                             bitrate=2000)
         
-        anim.save(str(output_file), writer=writer)
+        # Drive the ffmpeg pipe directly: each frame is drawn once and its raw
+        # RGBA buffer written straight to the encoder
+        with writer.saving(fig, str(output_file), dpi):
+            for frame, values in enumerate(frames):
+                mesh.set_array(values.ravel())
+                title.set_text(f'{variable.replace("_", " ").title()} - Frame {frame}')
+                writer.grab_frame()
         plt.close(fig)
         logger.info("Animation complete")
 
@@ -188,13 +231,15 @@ if __name__ == "__main__":
                       help='Type of data to visualize')
     parser.add_argument('--save-npy', action='store_true',
                       help='Save data as NPY files')
+    parser.add_argument('--jobs', type=int, default=None,
+                      help='Worker processes for NPY conversion and VTK reading (default: CPU count)')
     
     args = parser.parse_args()
     
     visualizer = CloverLeafVisualizer(args.input_dir, args.output_dir, args.npy_dir)
     
     if args.save_npy:
-        metadata = visualizer.process_all_files()
-        logger.info("Saved NPY files with metadata")
+        visualizer.process_all_files(jobs=args.jobs)
+        logger.info("Saved NPY files")
     
-    visualizer.create_animation(variable=args.variable, data_type=args.data_type)
\ No newline at end of file
+    visualizer.create_animation(variable=args.variable, data_type=args.data_type, jobs=args.jobs)
\ No newline at end of file
@@ -7,6 +7,7 @@ import os
 from pathlib import Path
 import logging
 from datetime import datetime
+from plot_utils import plot_field
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,23 +36,12 @@ def read_vtk_file(filename):
         logger.info(f"X coordinates shape: {x_coords.shape}")
         logger.info(f"Y coordinates shape: {y_coords.shape}")
         
-        # Get velocity components
-        xvel = None
-        yvel = None
-        
-        n_arrays = point_data.GetNumberOfArrays()
-        logger.info(f"Number of arrays: {n_arrays}")
-        
-        for i in range(n_arrays):
-            array_name = point_data.GetArrayName(i)
-            logger.info(f"Found array: {array_name}")
-            if array_name == 'x_vel':
-                xvel = numpy_support.vtk_to_numpy(point_data.GetArray(i))
-            elif array_name == 'y_vel':
-                yvel = numpy_support.vtk_to_numpy(point_data.GetArray(i))
-        
-        if xvel is None or yvel is None:
+        # Get velocity components by name; no other arrays are converted
+        logger.info(f"Number of arrays: {point_data.GetNumberOfArrays()}")
+        if not (point_data.HasArray('x_vel') and point_data.HasArray('y_vel')):
             raise RuntimeError("Velocity data not found in file")
+        xvel = numpy_support.vtk_to_numpy(point_data.GetArray('x_vel'))
+        yvel = numpy_support.vtk_to_numpy(point_data.GetArray('y_vel'))
             
         # Reshape arrays
         nx = len(x_coords)
@@ -60,7 +50,7 @@ def read_vtk_file(filename):
         yvel = yvel.reshape((ny, nx))
         
         # Calculate velocity magnitude as substitute for pressure
-        magnitude = np.sqrt(xvel**2 + yvel**2)
+        magnitude = np.hypot(xvel, yvel)
         
         return magnitude, xvel, yvel, x_coords, y_coords
         
@@ -74,7 +64,7 @@ def plot_frame(magnitude, xvel, yvel, x_coords, y_coords, time_step):
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(20, 8))
     
     # Plot 1: Velocity magnitude with vectors
-    im1 = ax1.pcolormesh(x_coords, y_coords, magnitude, shading='auto', cmap='viridis')
+    im1 = plot_field(ax1, x_coords, y_coords, magnitude)
     
     # Downsample for vectors
     skip = max(len(x_coords)//30, len(y_coords)//30)
@@ -90,7 +80,7 @@ def plot_frame(magnitude, xvel, yvel, x_coords, y_coords, time_step):
     
     # Plot 2: Velocity magnitude contours
     im2 = ax2.contourf(x_coords, y_coords, magnitude, 
-                       levels=20, cmap='viridis')
+                       levels=20, cmap='viridis', algorithm='threaded', nchunk=256)
     ax2.set_title('Velocity Magnitude Contours')
     fig.colorbar(im2, ax=ax2, label='Velocity magnitude')
     ax2.set_xlabel('X')
@@ -125,30 +115,42 @@ def create_visualization(input_dir, output_dir):
         fig.savefig(output_dir / f'final_state_analysis_{timestamp}.png', dpi=300, bbox_inches='tight')
         plt.close(fig)
         
-        # Create animation with timestamp
+        # Create animation with timestamp; axes, titles and the image/quiver artists
+        # are built once and only their data changes per frame
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(20, 8))
         
+        skip = max(len(x_coords)//30, len(y_coords)//30)
+        im1 = plot_field(ax1, x_coords, y_coords, magnitude)
+        vectors = ax1.quiver(x_coords[::skip], y_coords[::skip],
+                             xvel[::skip, ::skip], yvel[::skip, ::skip],
+                             scale=50, color='white', alpha=0.7)
+        ax1.set_title('Velocity Magnitude with Vectors')
+        ax2.set_title('Velocity Magnitude Contours')
+        suptitle = fig.suptitle('')
+        contours = None
+        
+        # Contour extraction is O(levels x grid) per frame: contour at most ~256
+        # points per side with 10 bands, which is indistinguishable at video size
+        ds = max(1, len(x_coords) // 256, len(y_coords) // 256)
+        
         def update(frame):
-            ax1.clear()
-            ax2.clear()
-            
+            nonlocal contours
             magnitude, xvel, yvel, x_coords, y_coords = read_vtk_file(vtk_files[frame])
             
             # Plot 1: Velocity magnitude with vectors
-            im1 = ax1.pcolormesh(x_coords, y_coords, magnitude, shading='auto', cmap='viridis')
-            skip = max(len(x_coords)//30, len(y_coords)//30)
-            ax1.quiver(x_coords[::skip], y_coords[::skip],
-                      xvel[::skip, ::skip], yvel[::skip, ::skip],
-                      scale=50, color='white', alpha=0.7)
-            ax1.set_title('Velocity Magnitude with Vectors')
+            im1.set_array(magnitude)
+            im1.set_clim(magnitude.min(), magnitude.max())
+            vectors.set_UVC(xvel[::skip, ::skip], yvel[::skip, ::skip])
             
-            # Plot 2: Velocity magnitude contours
-            im2 = ax2.contourf(x_coords, y_coords, magnitude, levels=20, cmap='viridis')
-            ax2.set_title('Velocity Magnitude Contours')
+            # Plot 2: Velocity magnitude contours (only the previous contour set is dropped)
+            if contours is not None:
+                contours.remove()
+            contours = ax2.contourf(x_coords[::ds], y_coords[::ds], magnitude[::ds, ::ds], levels=10,
+                                    cmap='viridis', algorithm='threaded', nchunk=256)
             
-            plt.suptitle(f'State Analysis - Step {frame}')
+            suptitle.set_text(f'State Analysis - Step {frame}')
             
-            return im1, im2
+            return im1, contours
         
         anim = FuncAnimation(fig, update, frames=len(vtk_files),
                            interval=200, blit=False)
@@ -2,6 +2,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from vtk import *
 import vtk.util.numpy_support as vtk_np
+from vtk.numpy_interface import dataset_adapter as dsa
 import glob
 import os
 import logging
@@ -33,7 +34,7 @@ class CloverLeafVTKReader:
         reader.Update()
         
         grid = reader.GetOutput()
-        point_data = grid.GetPointData()
+        point_data = dsa.WrapDataObject(grid).PointData
         
         # Get dimensions
         dims = grid.GetDimensions()
@@ -49,17 +50,12 @@ class CloverLeafVTKReader:
             'y_coords': y_coords
         }
         
-        # Extract all arrays
-        n_arrays = point_data.GetNumberOfArrays()
-        logger.info(f"Found {n_arrays} arrays in {os.path.basename(filename)}")
-        
-        for i in range(n_arrays):
-            array_name = point_data.GetArrayName(i)
-            array = point_data.GetArray(i)
-            if array is not None:
-                array_data = vtk_np.vtk_to_numpy(array)
-                logger.info(f"Reading array: {array_name} with shape {array_data.shape}")
-                data[array_name] = array_data
+        # Extract all arrays as float32
+        array_names = point_data.keys()
+        logger.info(f"Found {len(array_names)} arrays in {os.path.basename(filename)}")
+        
+        for array_name in array_names:
+            data[array_name] = np.asarray(point_data[array_name], dtype=np.float32)
                 
         return data
 
@@ -83,12 +79,12 @@ class CloverLeafVTKReader:
         
         if len(field_data.shape) > 1:
             # Vector data - plot magnitude
-            magnitude = np.sqrt(np.sum(field_data**2, axis=1))
-            field_2d = magnitude.reshape((len(y_coords), len(x_coords)))
+            magnitude = np.linalg.norm(field_data, axis=1)
+            field_2d = np.ascontiguousarray(magnitude.reshape((len(y_coords), len(x_coords))))
             title = f'{field_name} Magnitude'
         else:
             # Scalar data
-            field_2d = field_data.reshape((len(y_coords), len(x_coords)))
+            field_2d = np.ascontiguousarray(field_data.reshape((len(y_coords), len(x_coords))))
             title = field_name
             
         # Create figure
@@ -111,12 +107,11 @@ class CloverLeafVTKReader:
         """Analyze how a field evolves over time"""
         os.makedirs(output_dir, exist_ok=True)
         
-        max_values = []
-        mean_values = []
-        min_values = []
-        timesteps = []
+        # One row per file: (timestep, min, mean, max); rows for files without
+        # the field stay NaN and are dropped before plotting
+        stats = np.full((len(self.vtk_files), 4), np.nan)
         
-        for filename in self.vtk_files:
+        for i, filename in enumerate(self.vtk_files):
             data = self.read_vtk_file(filename)
             if field_name not in data:
                 logger.error(f"Field {field_name} not found in {filename}")
@@ -124,18 +119,17 @@ class CloverLeafVTKReader:
                 
             field_data = data[field_name]
             if len(field_data.shape) > 1:
-                # Vector data - use magnitude
-                values = np.sqrt(np.sum(field_data**2, axis=1))
+                # Vector data - use magnitude; einsum forms the row-wise dot product
+                # without materialising a squared temporary
+                values = np.sqrt(np.einsum('ij,ij->i', field_data, field_data))
             else:
                 values = field_data
-                
-            max_values.append(np.max(values))
-            mean_values.append(np.mean(values))
-            min_values.append(np.min(values))
             
             # Extract timestep from filename
-            timestep = int(filename.split('.')[-2])
-            timesteps.append(timestep)
+            stats[i] = (int(filename.split('.')[-2]), values.min(), values.mean(), values.max())
+        
+        stats = stats[~np.isnan(stats[:, 0])]
+        timesteps, min_values, mean_values, max_values = stats.T
         
         # Plot time evolution
         plt.figure(figsize=(12, 6))
@@ -1,4 +1,9 @@
 import argparse
+import errno
+import functools
+import hashlib
+import inspect
+import os
 import subprocess
 import sys
 import time
@@ -6,27 +11,75 @@ from pathlib import Path
 import logging
 import shutil
 import tarfile
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional, Union
 import json
 
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# gzip level for run archives: near-level-9 size at about half the time
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Non-VTK simulation outputs kept alongside the VTK files
+EXTRA_OUTPUTS = ("clover.out", "clover.visit")
+
+def move_file(src: Union[str, Path], dst: Union[str, Path]) -> None:
+    """Move a file with a single rename, copying only when it crosses filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(src), str(dst))
+
+def output_files(src_dir: Path) -> List[str]:
+    """Paths of the simulation outputs (VTK files, then clover.out/.visit) in src_dir."""
+    with os.scandir(src_dir) as entries:
+        files = sorted(entry.path for entry in entries
+                       if entry.name.endswith(".vtk") and entry.is_file())
+    files.extend(str(src_dir / name) for name in EXTRA_OUTPUTS if (src_dir / name).exists())
+    return files
+
+@contextmanager
+def open_tar_gz(archive_path: Path, compresslevel: int) -> Iterator[tarfile.TarFile]:
+    """Open a .tar.gz for writing, gzipping through pigz on all cores when it is installed."""
+    pigz = shutil.which("pigz")
+    try:
+        if pigz:
+            # Stream the uncompressed tar into pigz
+            with open(archive_path, "wb") as out:
+                proc = subprocess.Popen([pigz, f"-{compresslevel}", "-c"], stdin=subprocess.PIPE, stdout=out)
+                try:
+                    with tarfile.open(fileobj=proc.stdin, mode="w|") as tar:
+                        yield tar
+                except BaseException:
+                    proc.kill()
+                    raise
+                finally:
+                    try:
+                        proc.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                    proc.wait()
+                if proc.returncode != 0:
+                    raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        else:
+            # Random-access "w:gz" on the real file; the "w|gz" stream mode is slower
+            with tarfile.open(archive_path, "w:gz", compresslevel=compresslevel) as tar:
+                yield tar
+    except BaseException:
+        # Never leave a truncated archive behind under the final name
+        archive_path.unlink(missing_ok=True)
+        raise
+
 class CloverLeafRunner:
     def __init__(self, base_dir: Optional[str] = None):
         if base_dir:
             self.base_dir = Path(base_dir)
         else:
-            # Find repository root by looking for CloverLeaf_Serial directory
-            current = Path.cwd()
-            while current != current.parent:
-                if (current / "CloverLeaf_Serial").exists():
-                    self.base_dir = current
-                    break
-                current = current.parent
-            else:
-                raise FileNotFoundError("Could not find CloverLeaf repository root")
+            self.base_dir = self._find_repo_root()
 
         self.clover_dir = self.base_dir / "CloverLeaf_Serial"
         self.output_dir = self.base_dir / "data_processing/new_data"
@@ -38,10 +91,26 @@ class CloverLeafRunner:
         
         self.timing_data = {'simulation': 0, 'total': 0}
         
+        # Parameter tag of the current run, set by run_workflow
+        self.param_str: Optional[str] = None
+        
         logger.info(f"Base directory: {self.base_dir}")
         logger.info(f"CloverLeaf directory: {self.clover_dir}")
         logger.info(f"Output directory: {self.output_dir}")
 
+    @classmethod
+    @functools.lru_cache(maxsize=1)
+    def _find_repo_root(cls) -> Path:
+        """Find the repository root (the directory holding CloverLeaf_Serial), once per process."""
+        # This script lives in data_processing/, so the root is normally one of its
+        # first few parents; otherwise walk up from the working directory
+        cwd = Path.cwd()
+        candidates = list(Path(__file__).resolve().parents)[:3] + [cwd, *cwd.parents]
+        for candidate in candidates:
+            if (candidate / "CloverLeaf_Serial").is_dir():
+                return candidate
+        raise FileNotFoundError("Could not find CloverLeaf repository root")
+
     def _filter_input_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Filter parameters to only include those used in generate_input."""
         input_params = {
@@ -78,7 +147,7 @@ class CloverLeafRunner:
                   initial_timestep: float = 0.04,
                   timestep_rise: float = 1.5,
                   max_timestep: float = 0.04
-                  ) -> None:
+                  ) -> str:
         input_content = f"""*clover
  state 1 density={state1_density} energy={state1_energy}
  state 2 density={state2_density} energy={state2_energy} geometry=rectangle xmin={state2_xmin} xmax={state2_xmax} ymin={state2_ymin} ymax={state2_ymax}
@@ -101,14 +170,24 @@ class CloverLeafRunner:
 
 *endclover
 """
-        input_file = self.clover_dir / "clover.in"
-        input_file.write_text(input_content)
+        # Write the pre-encoded bytes straight to the fd (no text-mode wrapper)
+        fd = os.open(self.clover_dir / "clover.in", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, input_content.encode('ascii'))
+        finally:
+            os.close(fd)
+        return input_content
 
     def build_cloverleaf(self) -> None:
+        # make's dependency tracking recompiles only what changed
         logger.info("Building CloverLeaf...")
-        subprocess.run(["make", "clean"], cwd=self.clover_dir, check=True)
         subprocess.run(["make", "COMPILER=GNU"], cwd=self.clover_dir, check=True)
 
+    def rebuild(self) -> None:
+        """Force a full recompilation of CloverLeaf."""
+        subprocess.run(["make", "clean"], cwd=self.clover_dir, check=True)
+        self.build_cloverleaf()
+
     def run_simulation(self) -> float:
         start_time = time.time()
         
@@ -116,11 +195,10 @@ class CloverLeafRunner:
             self.build_cloverleaf()
         
         # Redirect stdout/stderr to DEVNULL
-        with open('/dev/null', 'w') as devnull:
-            result = subprocess.run(["./clover_leaf"], 
-                                cwd=self.clover_dir,
-                                stdout=devnull,
-                                stderr=devnull)
+        result = subprocess.run(["./clover_leaf"], 
+                            cwd=self.clover_dir,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
 
         # Only check return code
         if result.returncode != 0:
@@ -129,29 +207,39 @@ class CloverLeafRunner:
                 
         return time.time() - start_time
 
-    def process_files(self, iteration: int) -> float:
+    def process_files(self, iteration: int, dest_dir: Optional[Path] = None) -> float:
         start_time = time.time()
         
-        # Setup iteration directory
-        iter_dir = self.output_dir / f"iteration_{iteration}"
+        # Setup destination (iteration directory by default)
+        iter_dir = dest_dir or self.output_dir / f"iteration_{iteration}"
         iter_dir.mkdir(parents=True, exist_ok=True)
         
-        # Move output files 
-        for vtk_file in self.clover_dir.glob("*.vtk"):
-            shutil.move(str(vtk_file), str(iter_dir / vtk_file.name))
-        for output_file in ["clover.out", "clover.visit"]:
-            if (self.clover_dir / output_file).exists():
-                shutil.move(str(self.clover_dir / output_file), str(iter_dir / output_file))
+        # Move output files (one directory scan; plain string paths in the per-file loop)
+        dst_dir = str(iter_dir)
+        for path in output_files(self.clover_dir):
+            move_file(path, os.path.join(dst_dir, os.path.basename(path)))
                 
         return time.time() - start_time
 
-    def create_archive(self, param_str: str, iteration: int) -> None:
+    def create_archive(self, param_str: Optional[str] = None, iteration: int = 1,
+                       compresslevel: int = DEFAULT_COMPRESS_LEVEL,
+                       src_dir: Optional[Path] = None, remove: bool = False) -> None:
+        """Tar and gzip a run's outputs straight from src_dir (default: the CloverLeaf directory)."""
+        param_str = param_str or self.param_str
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         archive_name = f"clover_data_{param_str}_{timestamp}_{iteration:02d}.tar.gz"
+        arc_root = f"iteration_{param_str}_{iteration}"
+        
+        # Each file is read once, straight into the archive; no staging copy
+        files = output_files(src_dir or self.clover_dir)
+        with open_tar_gz(self.output_dir / archive_name, compresslevel) as tar:
+            for path in files:
+                tar.add(path, arcname=f"{arc_root}/{os.path.basename(path)}")
         
-        with tarfile.open(self.output_dir / archive_name, "w:gz") as tar:
-            tar.add(self.output_dir / f"iteration_{param_str}_{iteration}", 
-                arcname=f"iteration_{param_str}_{iteration}")
+        # Only delete the sources once the archive is complete (pigz included)
+        if remove:
+            for path in files:
+                os.unlink(path)
         logger.info(f"Created archive: {archive_name}")
 
     def cleanup(self) -> None:
@@ -163,17 +251,26 @@ class CloverLeafRunner:
         except subprocess.CalledProcessError as e:
             logger.error(f"Failed to clean CloverLeaf directory: {e}")
 
+    def _cache_dir(self, input_content: str) -> Path:
+        """Cache directory for a run's outputs, keyed by its clover.in and the clover_leaf build."""
+        # A rebuilt binary may produce different outputs, so its size/mtime are part of the key
+        binary = (self.clover_dir / "clover_leaf").stat()
+        key = hashlib.blake2b(input_content.encode())
+        key.update(f"{binary.st_size}:{binary.st_mtime_ns}".encode())
+        return self.output_dir / "cache" / key.hexdigest()
+
     def run_workflow(self, cells: int = 64, steps: int = 500, visit_freq: int = 1, 
-                visualize: bool = False, iteration: int = 1, **params):
+                visualize: bool = False, iteration: int = 1, use_cache: bool = False, **params):
         total_start = time.time()
         
         # Filter parameters for generate_input
         input_params = self._filter_input_params(params)
         
-        # Create parameter string for file naming
-        param_str = f"c{cells}_s{steps}_d1{params.get('state1_density', 0.2):.1f}_" \
-                    f"d2{params.get('state2_density', 1.0):.1f}_e1{params.get('state1_energy', 1.0):.1f}_" \
-                    f"e2{params.get('state2_energy', 2.5):.1f}"
+        # Create parameter string for file naming (kept on self for create_archive)
+        merged = {**INPUT_DEFAULTS, **params}
+        param_str = self.param_str = f"c{cells}_s{steps}_d1{merged['state1_density']:.1f}_" \
+                    f"d2{merged['state2_density']:.1f}_e1{merged['state1_energy']:.1f}_" \
+                    f"e2{merged['state2_energy']:.1f}"
         
         # Setup directories
         iter_dir = self.output_dir / f"iteration_{param_str}_{iteration}"
@@ -184,20 +281,42 @@ class CloverLeafRunner:
         logger.info(f"Output directory: {iter_dir}")
         
         sim_start = time.time()
-        self.generate_input(cells, steps, visit_freq, **input_params)
-        sim_time = self.run_simulation()
+        input_content = self.generate_input(cells, steps, visit_freq, **input_params)
+        
+        # Identical clover.in and binary mean identical outputs, so a cached run
+        # replaces the simulation (opt-in: cache entries are kept until deleted)
+        cached = False
+        if use_cache:
+            if not (self.clover_dir / "clover_leaf").exists():
+                self.build_cloverleaf()
+            cache_dir = self._cache_dir(input_content)
+            cached = cache_dir.is_dir()
+        if cached:
+            logger.info(f"Reusing cached outputs from {cache_dir}")
+        else:
+            sim_time = self.run_simulation()
         sim_end = time.time()
         self.timing_data['simulation'] = sim_end - sim_start
         
-        # Process files
+        # Process files: archive the outputs in one pass from where they live
         process_start = time.time()
-        self.process_files(iteration)
+        if cached:
+            self.create_archive(iteration=iteration, src_dir=cache_dir)
+        elif use_cache:
+            # Move (rename) the outputs into the cache, staged under a temporary
+            # name so a partial cache entry is never reused, and archive from there
+            staging_dir = cache_dir.with_name(f"{cache_dir.name}.tmp")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            self.process_files(iteration, dest_dir=staging_dir)
+            staging_dir.replace(cache_dir)
+            self.create_archive(iteration=iteration, src_dir=cache_dir)
+        else:
+            # Nothing keeps the outputs, so stream them straight from the
+            # CloverLeaf directory and delete them once the archive is written
+            self.create_archive(iteration=iteration, remove=True)
         process_end = time.time()
         self.timing_data['processing'] = process_end - process_start
         
-        # Create archive with parameter string
-        self.create_archive(param_str, iteration)
-        
         self.timing_data['total'] = time.time() - total_start
         
         # Save run configuration and timing data
@@ -209,6 +328,7 @@ class CloverLeafRunner:
                 **params
             },
             'timing': self.timing_data,
+            'cached': cached,
             'timestamp': datetime.now().isoformat(),
             'output_dir': str(iter_dir)
         }
@@ -218,6 +338,11 @@ class CloverLeafRunner:
         
         return self.timing_data
 
+# generate_input's keyword defaults: the single source for defaults used in file naming
+INPUT_DEFAULTS = {name: param.default
+                  for name, param in inspect.signature(CloverLeafRunner.generate_input).parameters.items()
+                  if param.default is not inspect.Parameter.empty}
+
 def main():
     parser = argparse.ArgumentParser(description='CloverLeaf Workflow Runner')
     # Core arguments
@@ -229,6 +354,8 @@ def main():
                        help='Frequency of VTK file generation (default: 1)')
     parser.add_argument('--visualize', action='store_true',
                        help='Generate visualizations')
+    parser.add_argument('--cache', dest='use_cache', action='store_true',
+                       help='Keep raw outputs in new_data/cache/ and reuse them for identical inputs')
     parser.add_argument('--base-dir', type=str, default=None,
                        help='Base directory for CloverLeaf project')
     parser.add_argument('--cleanup', action='store_true', default=False,
@@ -1,47 +1,67 @@
-import subprocess
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import matplotlib.pyplot as plt
+from run_cloverleaf import CloverLeafRunner
 
 # List of cell sizes to test
 # cells_array = [64, 128, 192, 256, 320, 384, 448, 512]
 
 cells_array = [x for x in range(64, 576, 64)]
 
+# Concurrent runs; each waits on its own CloverLeaf process, so threads are enough.
+# Leave cores free so the runs don't contend too much for the timings to compare.
+max_workers = max(1, (os.cpu_count() or 2) // 2)
+
+# Every run gets its own copy of CloverLeaf_Serial (in a temporary sweep directory)
+# so concurrent runs don't overwrite each other's clover.in / clover.out
+repo_root = Path(__file__).resolve().parent.parent
+
+# Build once up front so every copy inherits the binary and no compile time
+# lands inside a timed run
+source_runner = CloverLeafRunner(str(repo_root))
+if not (source_runner.clover_dir / 'clover_leaf').exists():
+    source_runner.build_cloverleaf()
+
 # Lists to store simulation data
 cells = []
 simulation_times = []
 
-# Function to run the CloverLeaf script and capture the output
-def run_cloverleaf(cells):
-    # Run the python script and capture the output
-    result = subprocess.run(['python3', 'run_cloverleaf.py', '--cells', str(cells)], capture_output=True, text=True)
-    return result.stdout
-
-# Function to extract the simulation time from the output
-def extract_simulation_time(output):
-    # Search for the line that contains the simulation time
-    for line in output.split('\n'):
-        if 'Simulation completed in' in line:
-            # Extract the time using a simple regex pattern
-            time_str = line.split('Simulation completed in')[1].split('seconds')[0].strip()
-            return float(time_str)
-    return None
-
-# Run simulations and collect data
-for cells_count in cells_array:
-    print(f"Running simulation for {cells_count} cells...")
-    
-    # Run the CloverLeaf simulation
-    output = run_cloverleaf(cells_count)
-    
-    # Extract simulation time from the output
-    simulation_time = extract_simulation_time(output)
+# Function to run the CloverLeaf workflow in-process and return its simulation time
+def run_cloverleaf(cells, sweep_dir):
+    # Give this run a private base directory with its own CloverLeaf_Serial
+    base_dir = Path(sweep_dir) / f'cells_{cells}'
+    shutil.copytree(repo_root / 'CloverLeaf_Serial', base_dir / 'CloverLeaf_Serial',
+                    symlinks=True, dirs_exist_ok=True)
     
+    # Always simulate: a cached run would time nothing
+    runner = CloverLeafRunner(str(base_dir))
+    try:
+        return runner.run_workflow(cells=cells, use_cache=False)['simulation']
+    except (Exception, SystemExit) as e:  # run_simulation exits on a failed run
+        print(f"Simulation for {cells} cells failed: {e!r}")
+        return None
+
+# Function to run one sweep point
+def run_and_extract(cells_count, sweep_dir):
+    print(f"Running simulation for {cells_count} cells...")
+    return cells_count, run_cloverleaf(cells_count, sweep_dir)
+
+# Run simulations concurrently and collect data (map keeps the cells order); the
+# per-run copies and their archives are removed with the temporary directory
+with tempfile.TemporaryDirectory(prefix='clover_sweep_') as sweep_dir:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run_and_extract, cells_array, [sweep_dir] * len(cells_array)))
+
+for cells_count, simulation_time in results:
     if simulation_time is not None:
         # Store the result in memory
         cells.append(cells_count)
         simulation_times.append(simulation_time)
     else:
-        print(f"Error: Could not extract simulation time for {cells_count} cells.")
+        print(f"Error: No simulation time for {cells_count} cells.")
 
 # Plot the data
 plt.figure(figsize=(8, 6))